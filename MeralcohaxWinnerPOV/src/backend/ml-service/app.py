@@ -3,14 +3,19 @@ Project KILOS - ML Service
 Main FastAPI application for NTL detection model serving
 """
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
 from datetime import datetime
 
-from model.ntl_detector import NTLDetector
+from model.ntl_detector import NTLDetector, rank_by_priority
 from utils.logger import setup_logger
 
 app = FastAPI(
@@ -29,7 +34,128 @@ app.add_middleware(
 )
 
 logger = setup_logger()
-ntl_detector = NTLDetector()
+
+# Loaded in a background thread after startup so the server accepts
+# connections while the model is unpickled
+ntl_detector: Optional[NTLDetector] = None
+
+# Worker processes for CPU-bound model calls (default: one per core)
+ML_WORKERS = int(os.getenv('ML_WORKERS', os.cpu_count() or 1))
+
+# Workers start from a clean forkserver (spawn where unavailable): forking
+# this process could copy locks held by the server and model-loader threads
+POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+# Per-process detector, loaded once by _init_worker in each pool process
+_worker_detector = None
+
+
+def _init_worker():
+    """Pool initializer: load the model once per worker process"""
+    global _worker_detector
+    _worker_detector = NTLDetector()
+
+
+def _predict_many_in_worker(records: List[dict]) -> List[dict]:
+    return _worker_detector.predict_many(records)
+
+
+def _predict_batch_in_worker(customer_ids: List[str], date: str) -> List[dict]:
+    return _worker_detector.predict_batch(customer_ids=customer_ids, date=date)
+
+
+async def _load_detector():
+    """Load the in-process detector without blocking the event loop"""
+    global ntl_detector
+    ntl_detector = await asyncio.to_thread(NTLDetector)
+    logger.info("Model loaded")
+
+
+def get_detector() -> NTLDetector:
+    """Return the in-process detector, or 503 while it is still loading"""
+    if ntl_detector is None:
+        raise HTTPException(status_code=503, detail="Model is still loading")
+    return ntl_detector
+
+
+async def run_in_pool(func, *args):
+    """Run a model call in the worker pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(app.state.pool, func, *args)
+
+
+# Micro-batching for /predict: requests arriving within the window are
+# scored together with one ensemble call
+PREDICT_MAX_BATCH = 64
+PREDICT_BATCH_WINDOW_S = 0.005
+
+# Strong references to dispatched batches until they complete
+_inflight_batches = set()
+
+
+async def _predict_batcher(queue: asyncio.Queue):
+    """Collect pending /predict requests and dispatch them as micro-batches"""
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await queue.get()]
+        deadline = loop.time() + PREDICT_BATCH_WINDOW_S
+        while len(items) < PREDICT_MAX_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        
+        # Don't wait for the result - keep collecting while workers score
+        task = asyncio.create_task(_dispatch_predictions(items))
+        _inflight_batches.add(task)
+        task.add_done_callback(_inflight_batches.discard)
+
+
+async def _dispatch_predictions(items: list):
+    """Score one micro-batch in the worker pool and resolve each request"""
+    try:
+        results = await run_in_pool(_predict_many_in_worker, [record for record, _ in items])
+    except Exception as e:
+        if len(items) == 1:
+            results = [e]
+        else:
+            # One bad record must not fail the whole window: rescore each
+            # request on its own so it gets its own result or error
+            results = await asyncio.gather(
+                *(run_in_pool(_predict_many_in_worker, [record]) for record, _ in items),
+                return_exceptions=True
+            )
+            results = [r if isinstance(r, BaseException) else r[0] for r in results]
+    
+    for (_, future), result in zip(items, results):
+        if future.done():
+            continue
+        if isinstance(result, BaseException):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+
+@app.on_event("startup")
+async def start_worker_pool():
+    app.state.pool = ProcessPoolExecutor(
+        max_workers=ML_WORKERS, mp_context=POOL_CONTEXT, initializer=_init_worker
+    )
+    app.state.predict_queue = asyncio.Queue()
+    app.state.batcher = asyncio.create_task(_predict_batcher(app.state.predict_queue))
+    app.state.model_loader = asyncio.create_task(_load_detector())
+    logger.info(f"Started {ML_WORKERS} prediction worker(s)")
+
+
+@app.on_event("shutdown")
+async def stop_worker_pool():
+    app.state.batcher.cancel()
+    app.state.pool.shutdown(wait=False, cancel_futures=True)
 
 
 class CustomerData(BaseModel):
@@ -48,6 +174,7 @@ class BatchPredictionRequest(BaseModel):
     """Batch prediction for daily hotlist generation"""
     customer_ids: List[str]
     date: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
+    limit: Optional[int] = Field(default=None, ge=1)  # Top-N hotlist entries
 
 
 class NTLPrediction(BaseModel):
@@ -65,8 +192,8 @@ async def root():
     """Health check endpoint"""
     return {
         "service": "KILOS ML Service",
-        "status": "operational",
-        "model_version": ntl_detector.model_version,
+        "status": "operational" if ntl_detector is not None else "loading",
+        "model_version": ntl_detector.model_version if ntl_detector is not None else None,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -79,7 +206,9 @@ async def predict_single(customer: CustomerData):
     try:
         logger.info(f"Predicting NTL for customer: {customer.customer_id}")
         
-        prediction = ntl_detector.predict_single(customer.model_dump())
+        future = asyncio.get_running_loop().create_future()
+        await app.state.predict_queue.put((customer.model_dump(), future))
+        prediction = await future
         
         return NTLPrediction(**prediction)
     
@@ -97,16 +226,14 @@ async def predict_batch(request: BatchPredictionRequest):
     try:
         logger.info(f"Batch prediction for {len(request.customer_ids)} customers")
         
-        predictions = ntl_detector.predict_batch(
-            customer_ids=request.customer_ids,
-            date=request.date
+        predictions = await run_in_pool(
+            _predict_batch_in_worker,
+            request.customer_ids,
+            request.date
         )
         
         # Sort by confidence score * estimated loss (priority score)
-        predictions.sort(
-            key=lambda x: x["confidence_score"] * x["estimated_monthly_loss"],
-            reverse=True
-        )
+        predictions = rank_by_priority(predictions, limit=request.limit)
         
         return [NTLPrediction(**pred) for pred in predictions]
     
@@ -118,22 +245,34 @@ async def predict_batch(request: BatchPredictionRequest):
 @app.get("/model/info")
 async def model_info():
     """Get model information and performance metrics"""
-    return ntl_detector.get_model_info()
+    return get_detector().get_model_info()
 
 
-@app.post("/model/retrain")
-async def trigger_retrain():
+def _run_retrain(detector: NTLDetector):
+    """Background retraining job; runs in the threadpool, never on the event loop"""
+    try:
+        result = detector.retrain()
+        logger.info(f"Retraining finished: {result}")
+    except Exception as e:
+        logger.error(f"Retraining error: {str(e)}")
+
+
+@app.post("/model/retrain", status_code=202)
+async def trigger_retrain(background_tasks: BackgroundTasks):
     """
     Trigger model retraining (admin only in production)
     Should be called weekly/monthly with new labeled data
+    
+    Returns immediately; training runs as a background task.
     """
-    try:
-        logger.info("Triggering model retraining")
-        result = ntl_detector.retrain()
-        return result
-    except Exception as e:
-        logger.error(f"Retraining error: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    detector = get_detector()
+    logger.info("Triggering model retraining")
+    background_tasks.add_task(_run_retrain, detector)
+    return {
+        "status": "accepted",
+        "message": "Model retraining started in the background",
+        "requested_at": datetime.now().isoformat()
+    }
 
 
 if __name__ == "__main__":
@@ -6,7 +6,7 @@ echo ""
 
 # Install in groups to avoid timeout
 echo "📦 Step 1/4: Installing FastAPI and web framework..."
-pip install --no-cache-dir --timeout 300 fastapi uvicorn python-multipart pydantic python-dotenv
+pip install --no-cache-dir --timeout 300 fastapi uvicorn gunicorn python-multipart pydantic python-dotenv
 
 echo ""
 echo "📦 Step 2/4: Installing core data science libraries..."
@@ -19,8 +19,9 @@ pip install --no-cache-dir --timeout 300 xgboost
 pip install --no-cache-dir --timeout 300 lightgbm
 
 echo ""
-echo "📦 Step 4/4: Installing additional utilities..."
-pip install --no-cache-dir --timeout 300 imbalanced-learn joblib geopy
+echo "📦 Step 4/4: Installing additional utilities and optional accelerators..."
+pip install --no-cache-dir --timeout 300 joblib
+pip install --no-cache-dir --timeout 300 -r "$(dirname "$0")/requirements-perf.txt"
 
 echo ""
 echo "✅ Installation complete!"
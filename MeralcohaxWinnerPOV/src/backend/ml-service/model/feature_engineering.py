@@ -5,9 +5,40 @@ Transforms raw customer data into ML-ready features
 
 import numpy as np
 import pandas as pd
-from typing import List
+from typing import List, Dict, Any, Union
 from scipy import stats
-from geopy.distance import geodesic
+
+# Polars is optional: transform() also accepts polars DataFrames when installed
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+from ._kernels import (
+    NUMBA_AVAILABLE, CONSUMPTION_FEATURE_COUNT,
+    consumption_feats, consumption_feats_batch
+)
+
+
+# Mean Earth radius (IUGG) in meters
+EARTH_RADIUS_M = 6_371_008.8
+
+
+def _is_polars(data) -> bool:
+    return pl is not None and isinstance(data, pl.DataFrame)
+
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance in meters
+    
+    Works element-wise on scalars or NumPy arrays, so distances for a whole
+    batch come from one call. Within ~0.5% of the ellipsoidal geodesic.
+    """
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
 
 class FeatureEngineer:
     """
@@ -20,65 +51,204 @@ class FeatureEngineer:
     4. Geospatial Features (location-based)
     """
     
+    # Customer type codes shared by the batch and single-customer paths
+    CUSTOMER_TYPE_MAP = {'residential': 0, 'commercial': 1, 'industrial': 2}
+    
+    # Stable business category codes (0 = none/unknown). Replaces hash(),
+    # which is salted per process and made saved models non-reproducible.
+    BUSINESS_CATEGORY_CODES = {
+        'retail': 1, 'restaurant': 2, 'sari_sari_store': 3, 'grocery': 4,
+        'office': 5, 'hotel': 6, 'hospital': 7, 'school': 8,
+        'manufacturing': 9, 'warehouse': 10, 'mall': 11, 'bank': 12,
+        'gas_station': 13, 'laundry': 14, 'salon': 15, 'internet_cafe': 16,
+        'bakery': 17, 'pharmacy': 18, 'church': 19, 'government': 20,
+    }
+    
+    # Columns produced by transform(): consumption + profile (3) + grid (3)
+    FEATURE_COUNT = CONSUMPTION_FEATURE_COUNT + 6
+    CONSUMPTION_COLS = slice(0, CONSUMPTION_FEATURE_COUNT)
+    PROFILE_COLS = slice(CONSUMPTION_FEATURE_COUNT, CONSUMPTION_FEATURE_COUNT + 3)
+    GRID_COLS = slice(CONSUMPTION_FEATURE_COUNT + 3, FEATURE_COUNT)
+    
     def __init__(self):
-        self.feature_names = []
+        self.feature_names = self._get_feature_names()
+        
+        # Centered month index and its sum of squares for the closed-form
+        # least-squares slope, precomputed for the standard 12-month window
+        self._trend_basis_cache = {}
+        self._trend_basis(12)
     
-    def transform(self, data: pd.DataFrame) -> np.ndarray:
+    def transform(self, data: Union[pd.DataFrame, "pl.DataFrame"]) -> np.ndarray:
         """
         Transform raw customer data to feature matrix
         
+        Each feature block is computed column-wise over the whole batch
+        (one NumPy call per statistic) instead of iterating row by row.
+        Polars frames are read without a pandas conversion; a fixed-width
+        pl.Array consumption column is used as a zero-copy (N, T) matrix.
+        Every block writes straight into its columns of one preallocated
+        (N, FEATURE_COUNT) buffer.
+        
         Args:
-            data: DataFrame with customer information
+            data: pandas or polars DataFrame with customer information
             
         Returns:
             numpy array with engineered features
         """
-        features = []
+        features = np.empty((len(data), self.FEATURE_COUNT))
+        self._consumption_block(data, features[:, self.CONSUMPTION_COLS])
+        self._profile_block(data, features[:, self.PROFILE_COLS])
+        self._grid_block(data, features[:, self.GRID_COLS])
+        
+        return features
+    
+    def transform_one(self, customer: Dict[str, Any]) -> np.ndarray:
+        """
+        Transform a single customer record without building a DataFrame
         
-        for _, row in data.iterrows():
-            customer_features = self._extract_features(row)
-            features.append(customer_features)
+        Fast path for single predictions; produces the same row as
+        transform(pd.DataFrame([customer])).
         
-        return np.array(features)
+        Args:
+            customer: Dictionary with customer information
+            
+        Returns:
+            (1, FEATURE_COUNT) numpy array
+        """
+        features = np.empty((1, self.FEATURE_COUNT))
+        self._extract_features(customer, features[0])
+        return features
     
-    def _extract_features(self, customer: pd.Series) -> List[float]:
-        """Extract all features for a single customer"""
-        features = []
+    def _consumption_block(self, data, out: np.ndarray):
+        """
+        Fill out (N, 15) with consumption features for every customer
+        
+        Histories are grouped by length so each group can be stacked into a
+        dense (N, T) matrix. Customers with fewer than 12 readings keep the
+        all-zero placeholder.
+        """
+        out[:] = 0
+        if 'consumption_array' not in data.columns:
+            return
         
+        if _is_polars(data):
+            groups = self._polars_consumption_groups(data['consumption_array'])
+        else:
+            groups = self._pandas_consumption_groups(data['consumption_array'])
+        
+        for rows, consumption in groups:
+            if NUMBA_AVAILABLE:
+                features = np.empty((len(rows), CONSUMPTION_FEATURE_COUNT))
+                consumption_feats_batch(consumption, features)
+            else:
+                features = self._consumption_matrix_features(np.asarray(consumption, dtype=np.float64))
+            out[rows] = features
+    
+    @staticmethod
+    def _pandas_consumption_groups(histories: pd.Series):
+        """Yield (row indices, (n, T) matrix) for each history length T >= 12"""
+        histories = histories.to_numpy()
+        lengths = np.fromiter(
+            (len(c) if isinstance(c, (list, np.ndarray)) else 0 for c in histories),
+            dtype=np.int64,
+            count=len(histories)
+        )
+        
+        for length in np.unique(lengths[lengths >= 12]):
+            rows = np.flatnonzero(lengths == length)
+            yield rows, np.array(histories[rows].tolist(), dtype=np.float64)
+    
+    @staticmethod
+    def _polars_consumption_groups(histories: "pl.Series"):
+        """Polars version of _pandas_consumption_groups"""
+        if isinstance(histories.dtype, pl.Array) and histories.null_count() == 0:
+            # Fixed-width array column: one zero-copy (N, T) view
+            if histories.dtype.size >= 12:
+                yield np.arange(len(histories)), histories.to_numpy()
+            return
+        if isinstance(histories.dtype, pl.Array):
+            histories = histories.cast(pl.List(histories.dtype.inner))
+        if not isinstance(histories.dtype, pl.List):
+            return
+        
+        lengths = histories.list.len().fill_null(0).to_numpy()
+        for length in np.unique(lengths[lengths >= 12]):
+            mask = lengths == length
+            rows = np.flatnonzero(mask)
+            yield rows, histories.filter(pl.Series(mask)).list.to_array(int(length)).to_numpy()
+    
+    def _profile_block(self, data, out: np.ndarray):
+        """Fill out (N, 3) with type code, contracted load, reading count"""
+        if 'customer_type' not in data.columns:
+            out[:, 0] = 0
+        elif _is_polars(data):
+            out[:, 0] = data['customer_type'].replace_strict(
+                self.CUSTOMER_TYPE_MAP, default=0, return_dtype=pl.Float64
+            ).to_numpy()
+        else:
+            out[:, 0] = data['customer_type'].map(self.CUSTOMER_TYPE_MAP).fillna(0).to_numpy(dtype=np.float64)
+        
+        out[:, 1] = self._numeric_column(data, 'contracted_load_kw')
+        out[:, 2] = self._numeric_column(data, 'total_readings')
+    
+    def _grid_block(self, data, out: np.ndarray):
+        """Fill out (N, 3) with transformer/grid features"""
+        out[:, 0] = self._numeric_column(data, 'capacity_kva')
+        out[:, 1] = self._numeric_column(data, 'transformer_loss')
+        out[:, 2] = self._numeric_column(data, 'transformer_anomalies')
+    
+    def _trend_basis(self, length: int):
+        """Return (x - mean(x), sum((x - mean(x))**2)) for x = 0..length-1"""
+        basis = self._trend_basis_cache.get(length)
+        if basis is None:
+            x = np.arange(length, dtype=np.float64)
+            x_centered = x - x.mean()
+            basis = (x_centered, float(np.dot(x_centered, x_centered)))
+            self._trend_basis_cache[length] = basis
+        return basis
+    
+    @staticmethod
+    def _numeric_column(data, column: str, default: float = 0.0) -> np.ndarray:
+        """Column as float64 array, or a constant if the column is missing"""
+        if column not in data.columns:
+            return np.full(len(data), default)
+        if _is_polars(data):
+            return data[column].cast(pl.Float64).to_numpy()
+        return data[column].astype(np.float64).to_numpy()
+    
+    def _extract_features(self, customer: Union[pd.Series, Dict[str, Any]], out: np.ndarray):
+        """
+        Extract all features for a single customer (Series or plain dict)
+        
+        Args:
+            customer: Customer record
+            out: 1-D buffer of length FEATURE_COUNT, written in place
+        """
         # 1. CONSUMPTION FEATURES from consumption_array
         # This is the ONLY signal the model should use - no boolean flags!
         consumption = customer.get('consumption_array', [])
-        if isinstance(consumption, list) and len(consumption) >= 12:
-            features.extend(self._consumption_features(consumption))
+        if isinstance(consumption, (list, np.ndarray)) and len(consumption) >= 12:
+            self._consumption_features(consumption, out[self.CONSUMPTION_COLS])
         else:
-            features.extend([0] * 15)  # Placeholder for missing data
+            out[self.CONSUMPTION_COLS] = 0  # Placeholder for missing data
         
         # 2. CUSTOMER PROFILE FEATURES
-        customer_type_map = {'residential': 0, 'commercial': 1, 'industrial': 2}
-        features.extend([
-            float(customer_type_map.get(customer.get('customer_type', 'residential'), 0)),
-            float(customer.get('contracted_load_kw', 0)),
-            float(customer.get('total_readings', 0)),
-        ])
+        profile = out[self.PROFILE_COLS]
+        profile[0] = self.CUSTOMER_TYPE_MAP.get(customer.get('customer_type', 'residential'), 0)
+        profile[1] = float(customer.get('contracted_load_kw', 0))
+        profile[2] = float(customer.get('total_readings', 0))
         
         # 3. TRANSFORMER/GRID FEATURES
-        features.extend([
-            float(customer.get('capacity_kva', 0)),
-            float(customer.get('transformer_loss', 0)),
-            float(customer.get('transformer_anomalies', 0)),
-        ])
+        grid = out[self.GRID_COLS]
+        grid[0] = float(customer.get('capacity_kva', 0))
+        grid[1] = float(customer.get('transformer_loss', 0))
+        grid[2] = float(customer.get('transformer_anomalies', 0))
         
         # NOTE: Removed has_meter_tamper, has_billing_anomaly, has_consumption_anomaly
         # Those are labels derived from the same logic as risk_level (data leakage)
         # Model must learn NTL patterns ONLY from consumption time series
-        
-        # Store feature names (first time only)
-        if not self.feature_names:
-            self.feature_names = self._get_feature_names()
-        
-        return features
     
-    def _consumption_features(self, consumption: List[float]) -> List[float]:
+    def _consumption_features(self, consumption: List[float], out: np.ndarray):
         """
         Extract temporal consumption patterns
         
@@ -88,17 +258,24 @@ class FeatureEngineer:
         - Recent vs. historical ratio
         - Drop detection
         - Coefficient of variation
+        
+        Writes the 15 values into out in place. Uses the compiled kernel in
+        _kernels when Numba is installed.
         """
-        consumption = np.array(consumption)
+        if NUMBA_AVAILABLE:
+            consumption_feats(np.asarray(consumption, dtype=np.float64), out)
+            return
+        
+        consumption = np.asarray(consumption, dtype=np.float64)
         
         # Basic statistics
         mean_consumption = np.mean(consumption)
         std_consumption = np.std(consumption)
         median_consumption = np.median(consumption)
         
-        # Trend (linear regression slope)
-        x = np.arange(len(consumption))
-        slope, _ = np.polyfit(x, consumption, 1)
+        # Trend (closed-form least-squares slope over the month index)
+        x_centered, denom = self._trend_basis(len(consumption))
+        slope = np.dot(consumption - mean_consumption, x_centered) / denom
         
         # Recent vs. historical (last 3 months vs. previous 9)
         recent_avg = np.mean(consumption[-3:])
@@ -106,10 +283,10 @@ class FeatureEngineer:
         recent_ratio = recent_avg / historical_avg if historical_avg > 0 else 1
         
         # Drop detection (>30% decrease)
-        max_drop = 0
-        for i in range(1, len(consumption)):
-            drop = (consumption[i-1] - consumption[i]) / consumption[i-1] if consumption[i-1] > 0 else 0
-            max_drop = max(max_drop, drop)
+        previous = consumption[:-1]
+        drops = np.divide(previous - consumption[1:], previous,
+                          out=np.zeros_like(previous), where=previous > 0)
+        max_drop = float(drops.max(initial=0))
         
         # Coefficient of variation (volatility measure)
         cv = std_consumption / mean_consumption if mean_consumption > 0 else 0
@@ -125,7 +302,71 @@ class FeatureEngineer:
         # Percentage of months with zero consumption
         zero_months = np.sum(consumption == 0) / len(consumption)
         
-        return [
+        out[0] = mean_consumption
+        out[1] = std_consumption
+        out[2] = median_consumption
+        out[3] = slope
+        out[4] = recent_ratio
+        out[5] = max_drop
+        out[6] = cv
+        out[7] = mom_mean
+        out[8] = mom_std
+        out[9] = z_score_recent
+        out[10] = zero_months
+        out[11] = recent_avg
+        out[12] = historical_avg
+        out[13] = np.min(consumption)
+        out[14] = np.max(consumption)
+    
+    def _consumption_matrix_features(self, consumption: np.ndarray) -> np.ndarray:
+        """
+        Vectorized equivalent of _consumption_features
+        
+        Args:
+            consumption: (N, T) matrix of monthly kWh, T >= 12
+            
+        Returns:
+            (N, 15) matrix, columns in the same order as _consumption_features
+        """
+        n, length = consumption.shape
+        zeros = np.zeros(n)
+        
+        # Basic statistics
+        mean_consumption = consumption.mean(axis=1)
+        std_consumption = consumption.std(axis=1)
+        median_consumption = np.median(consumption, axis=1)
+        
+        # Trend (closed-form least-squares slope over the month index)
+        x_centered, denom = self._trend_basis(length)
+        slope = ((consumption - mean_consumption[:, None]) @ x_centered) / denom
+        
+        # Recent vs. historical (last 3 months vs. previous)
+        recent_avg = consumption[:, -3:].mean(axis=1)
+        historical_avg = consumption[:, :-3].mean(axis=1)
+        recent_ratio = np.divide(recent_avg, historical_avg, out=np.ones(n), where=historical_avg > 0)
+        
+        # Drop detection: largest month-over-month relative decrease
+        previous = consumption[:, :-1]
+        drops = np.divide(previous - consumption[:, 1:], previous,
+                          out=np.zeros_like(previous), where=previous > 0)
+        max_drop = np.maximum(drops.max(axis=1), 0)
+        
+        # Coefficient of variation (volatility measure)
+        cv = np.divide(std_consumption, mean_consumption, out=zeros.copy(), where=mean_consumption > 0)
+        
+        # Month-over-month changes
+        mom_changes = np.diff(consumption, axis=1)
+        mom_mean = mom_changes.mean(axis=1)
+        mom_std = mom_changes.std(axis=1)
+        
+        # Z-score of recent consumption
+        z_score_recent = np.divide(recent_avg - mean_consumption, std_consumption,
+                                   out=zeros.copy(), where=std_consumption > 0)
+        
+        # Percentage of months with zero consumption
+        zero_months = (consumption == 0).mean(axis=1)
+        
+        return np.column_stack([
             mean_consumption,
             std_consumption,
             median_consumption,
@@ -139,9 +380,9 @@ class FeatureEngineer:
             zero_months,
             recent_avg,
             historical_avg,
-            np.min(consumption),
-            np.max(consumption)
-        ]
+            consumption.min(axis=1),
+            consumption.max(axis=1)
+        ])
     
     def _ami_features(self, ami_data: dict) -> List[float]:
         """
@@ -194,7 +435,7 @@ class FeatureEngineer:
         
         # Business category (simplified encoding)
         business_category = customer.get('business_category', 'none')
-        category_encoded = hash(business_category) % 100  # Simple hash encoding
+        category_encoded = self.BUSINESS_CATEGORY_CODES.get(business_category, 0)
         
         # Account age (months) - simulated
         account_age = 24  # Default 2 years
@@ -223,9 +464,14 @@ class FeatureEngineer:
         lat_normalized = (lat - 14.0) / 7.0  # Rough normalization
         lon_normalized = (lon - 120.0) / 7.0
         
-        # Distance from transformer (simulated, in meters)
-        # In production: calculate actual distance
-        distance_from_transformer = 50
+        # Distance from transformer in meters (50 m default when the
+        # transformer location is unknown)
+        transformer_lat = customer.get('transformer_lat')
+        transformer_lon = customer.get('transformer_lng')
+        if transformer_lat is not None and transformer_lon is not None:
+            distance_from_transformer = float(_haversine(lat, lon, transformer_lat, transformer_lon))
+        else:
+            distance_from_transformer = 50
         
         # Density score (simulated)
         # In production: count customers within radius
@@ -5,19 +5,27 @@ Ensemble ML model for Non-Technical Loss detection
 
 import numpy as np
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 import joblib
+from joblib import Parallel, delayed
 import os
+import shutil
+import threading
+from itertools import chain
+from collections import OrderedDict
 
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
+from sklearn.ensemble import RandomForestClassifier
 from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
+from lightgbm import LGBMClassifier, LGBMRegressor
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
-from imblearn.over_sampling import SMOTE
 
 from .feature_engineering import FeatureEngineer
+from .onnx_backend import ONNX_AVAILABLE, OnnxEnsemble, export_models
+from .treelite_backend import TREELITE_AVAILABLE, CompiledEnsemble, compile_models
+from .fil_backend import FIL_AVAILABLE, FilEnsemble
+from .risk_levels import RISK_ACTIONS, RISK_LEVELS, risk_buckets
 
 # Simple logger fallback
 try:
@@ -31,6 +39,89 @@ except:
     handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
     logger.addHandler(handler)
 
+MODEL_DIR = "model/saved_models"
+MODEL_PATH = os.path.join(MODEL_DIR, "ensemble_model.pkl")
+
+# Each save writes its artifacts - the fitted ensemble members (pickled apart
+# from MODEL_PATH, only unpickled when native predict or the GPU path needs
+# them) and the ONNX/Treelite/lleaves files - into a new directory recorded
+# in MODEL_PATH. A process that loaded MODEL_PATH earlier keeps reading the
+# artifacts that match its scaler and student while a newer save lands.
+ARTIFACTS_DIR_PREFIX = "artifacts_"
+ESTIMATORS_FILE = "ensemble_estimators.pkl"
+
+# Per-save estimators pickles written directly into MODEL_DIR by older saves
+LEGACY_ESTIMATORS_PREFIX = "ensemble_estimators_"
+
+# Uncompressed protocol-5 pickles let joblib memory-map every array, so
+# worker processes share the tree arrays through the page cache
+MODEL_DUMP_KWARGS = {'compress': 0, 'protocol': 5}
+
+# Max predict_single results kept for repeated identical requests
+PREDICTION_CACHE_SIZE = 50_000
+
+# Serve the distilled single-LightGBM student instead of the full ensemble
+# (the ensemble is still trained and saved, and is used for retraining)
+USE_DISTILLED_MODEL = os.getenv('KILOS_USE_DISTILLED_MODEL', '1') == '1'
+
+# predict_proba batches at least this large are scored on the GPU (RAPIDS FIL)
+GPU_MIN_BATCH = 10_000
+
+# Native predict_proba batches at least this large run multi-threaded: the
+# ensemble members in parallel threads (tree traversal releases the GIL),
+# the student with LightGBM's own thread pool
+PARALLEL_PREDICT_MIN_ROWS = 10_000
+
+# Theft indicators, one bit each in the masks built by
+# NTLDetector._identify_theft_patterns_batch (bit i -> THEFT_INDICATORS[i])
+THEFT_INDICATORS = (
+    "Consumption dropped >50% vs. historical average",
+    "AMI tamper alerts detected",
+    "Abnormal voltage drop (possible bypass)",
+    "Residential account with commercial-level consumption",
+)
+DEFAULT_THEFT_INDICATOR = "Statistical anomaly detected in consumption pattern"
+_INDICATORS_BY_MASK = tuple(
+    tuple(text for bit, text in enumerate(THEFT_INDICATORS) if mask >> bit & 1) or (DEFAULT_THEFT_INDICATOR,)
+    for mask in range(1 << len(THEFT_INDICATORS))
+)
+
+
+def _fit_model(name: str, model, X: np.ndarray, y) -> tuple:
+    """Fit one ensemble member (runs in a joblib worker process)"""
+    return name, model.fit(X, y)
+
+
+def rank_by_priority(predictions: List[Dict[str, Any]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Order predictions by priority score (confidence * estimated loss), highest first
+    
+    Uses a NumPy argsort over the scores instead of a Python key-function
+    sort. With a limit only the top entries are selected (argpartition) and
+    sorted, so the tail of a large batch is never ordered.
+    
+    Args:
+        predictions: Prediction dictionaries
+        limit: Keep only the top N predictions
+    """
+    n = len(predictions)
+    if n == 0:
+        return []
+    
+    priority = np.fromiter(
+        (p["confidence_score"] * p["estimated_monthly_loss"] for p in predictions),
+        dtype=np.float64,
+        count=n
+    )
+    
+    if limit is not None and limit < n:
+        top = np.argpartition(-priority, limit - 1)[:limit]
+        order = top[np.argsort(-priority[top], kind="stable")]
+    else:
+        order = np.argsort(-priority, kind="stable")
+    
+    return [predictions[i] for i in order]
+
 
 class NTLDetector:
     """
@@ -38,9 +129,11 @@ class NTLDetector:
     
     Combines multiple algorithms:
     - Random Forest: Handles non-linear patterns
-    - Gradient Boosting: Sequential error correction
     - XGBoost: High performance on tabular data
     - LightGBM: Fast training with categorical features
+    
+    The ensemble is distilled into a single LightGBM regressor (the
+    student) that serves predictions; see _distill.
     """
     
     def __init__(self):
@@ -55,19 +148,16 @@ class NTLDetector:
                 max_depth=15,
                 min_samples_split=10,
                 class_weight='balanced',
-                random_state=42
-            ),
-            'gradient_boosting': GradientBoostingClassifier(
-                n_estimators=150,
-                max_depth=10,
-                learning_rate=0.1,
+                max_samples=0.5,  # Bootstrap half the rows per tree
+                n_jobs=1,  # Single-request inference: avoid thread-pool start-up
                 random_state=42
             ),
             'xgboost': XGBClassifier(
                 n_estimators=200,
                 max_depth=12,
                 learning_rate=0.1,
-                scale_pos_weight=10,  # Handle class imbalance
+                scale_pos_weight=10,  # Reset from the label ratio in train()
+                n_jobs=1,
                 random_state=42
             ),
             'lightgbm': LGBMClassifier(
@@ -75,130 +165,375 @@ class NTLDetector:
                 max_depth=12,
                 learning_rate=0.1,
                 class_weight='balanced',
+                n_jobs=1,
                 random_state=42
             )
         }
         
         # Model weights (tuned based on validation performance)
+        # sklearn GradientBoosting was dropped: 5-20x slower than XGBoost/LightGBM
+        # for the same signal, its 0.25 weight went to the two boosters
         self.model_weights = {
-            'random_forest': 0.20,
-            'gradient_boosting': 0.25,
-            'xgboost': 0.30,
-            'lightgbm': 0.25
+            'random_forest': 0.25,
+            'xgboost': 0.40,
+            'lightgbm': 0.35
         }
         
         self.is_trained = False
+        self.student = None  # Distilled LGBMRegressor, see _distill
+        self.onnx_paths = {}
+        self.compiled_paths = {}
+        self._backend = None  # CompiledEnsemble / OnnxEnsemble, else native models
+        self._student_backend = None
+        self._fil = None  # FilEnsemble, built on first GPU batch
+        self._artifacts_dir = None  # Entry under MODEL_DIR holding this save's artifacts
+        self._estimators_path = None  # Estimators pickle matching MODEL_PATH
+        self._estimators_loaded = True  # False until _estimators_path is read
+        self._estimators_lock = threading.Lock()
+        self._prediction_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
         self._load_model()
+        self._refresh_ensemble()
+    
+    def _refresh_ensemble(self):
+        """Cache model order, weight vector and scaler constants for inference"""
+        self._cache_scaler()
+        self._ordered_models = list(self.models.values())
+        self._weight_vec = np.array([self.model_weights[name] for name in self.models])
+        self._fil = None
+        with self._cache_lock:
+            self._prediction_cache.clear()
+    
+    def _cache_scaler(self):
+        """Keep the fitted scaler's mean and 1/scale as float32 arrays"""
+        if hasattr(self.scaler, 'mean_'):
+            self._mean32 = self.scaler.mean_.astype(np.float32)
+            self._inv_scale32 = (1.0 / self.scaler.scale_).astype(np.float32)
+        else:
+            self._mean32 = self._inv_scale32 = None
+    
+    def _scale(self, features: np.ndarray) -> np.ndarray:
+        """
+        Standardize features into one contiguous float32 buffer
+        
+        Applies the cached scaler constants in place on a single float32
+        copy, skipping StandardScaler.transform's validation and float64
+        temporaries. All models (and the ONNX/Treelite backends) read this
+        same array, so none of them has to make its own converted copy.
+        """
+        if self._mean32 is None:
+            # Unfitted scaler - let scikit-learn raise its usual error
+            return np.ascontiguousarray(self.scaler.transform(features), dtype=np.float32)
+        
+        X = np.array(features, dtype=np.float32, order='C')
+        np.subtract(X, self._mean32, out=X)
+        np.multiply(X, self._inv_scale32, out=X)
+        return X
+    
+    def featurize_batch(self, data: pd.DataFrame) -> np.ndarray:
+        """
+        Feature matrix for a whole frame, scaled, as contiguous float32
+        
+        The model-ready input for every batch path; compute it once and
+        reuse it when the same customers are scored more than once.
+        """
+        return self._scale(self.feature_engineer.transform(data))
+    
+    def _ensemble_proba(self, X_scaled: np.ndarray) -> np.ndarray:
+        """
+        Weighted ensemble probability of theft for each row of X_scaled
+        
+        Answered by the distilled student when one is trained and
+        USE_DISTILLED_MODEL is on.
+        
+        Returns:
+            Array of shape (n_samples,)
+        """
+        if USE_DISTILLED_MODEL and self.student is not None:
+            if self._student_backend is not None:
+                probs = self._student_backend.predict_proba(X_scaled)[0]
+            elif len(X_scaled) >= PARALLEL_PREDICT_MIN_ROWS:
+                # Large batches: let LightGBM spread the rows over every core
+                probs = self.student.predict(X_scaled, num_threads=os.cpu_count() or 1)
+            else:
+                probs = self.student.predict(X_scaled)
+            return np.clip(probs, 0.0, 1.0)
+        
+        if self._backend is not None:
+            return self._weight_vec @ self._backend.predict_proba(X_scaled)
+        
+        self._ensure_estimators()
+        if len(X_scaled) >= PARALLEL_PREDICT_MIN_ROWS:
+            probs = np.array(Parallel(n_jobs=len(self._ordered_models), prefer='threads')(
+                delayed(model.predict_proba)(X_scaled) for model in self._ordered_models
+            ))[:, :, 1]
+        else:
+            probs = np.array([model.predict_proba(X_scaled)[:, 1] for model in self._ordered_models])
+        return self._weight_vec @ probs
     
     def _load_model(self):
         """Load pre-trained model if exists"""
-        model_path = "model/saved_models/ensemble_model.pkl"
-        if os.path.exists(model_path):
+        if os.path.exists(MODEL_PATH):
             try:
-                saved_data = joblib.load(model_path)
-                self.models = saved_data['models']
+                saved_data = joblib.load(MODEL_PATH, mmap_mode='r')
+                
+                # Older pickles may carry members no longer in the ensemble
+                # (e.g. gradient_boosting): keep ours and renormalize weights
+                if 'models' in saved_data:
+                    # Single-file pickle with the estimators inline
+                    saved_models = saved_data['models']
+                    self.models = {name: saved_models[name] for name in self.models if name in saved_models}
+                else:
+                    # Unfitted placeholders until _ensure_estimators runs
+                    saved_names = saved_data['model_names']
+                    self.models = {name: model for name, model in self.models.items() if name in saved_names}
+                    self._estimators_path = os.path.join(MODEL_DIR, saved_data['estimators_file'])
+                    self._artifacts_dir = saved_data.get(
+                        'artifacts_dir', os.path.basename(self._estimators_path)
+                    )
+                    self._estimators_loaded = False
+                weights = {name: saved_data['weights'][name] for name in self.models}
+                total_weight = sum(weights.values())
+                self.model_weights = {name: w / total_weight for name, w in weights.items()}
+                
                 self.scaler = saved_data['scaler']
-                self.model_weights = saved_data['weights']
+                self.student = saved_data.get('student')
+                self.onnx_paths = saved_data.get('onnx_models', {})
+                self.compiled_paths = saved_data.get('compiled_models', {})
                 self.is_trained = True
                 logger.info("Loaded pre-trained model successfully")
             except Exception as e:
                 logger.warning(f"Could not load model: {e}")
+                return
+            self._load_backend()
     
-    def train(self, training_data: pd.DataFrame, labels: pd.Series):
+    def _ensure_estimators(self):
+        """
+        Unpickle the fitted ensemble members on first use
+        
+        Serving normally goes through the compiled/ONNX backends or the
+        student, so the estimators pickle is only read for native predict
+        and the GPU path.
+        """
+        if self._estimators_loaded:
+            return
+        with self._estimators_lock:
+            if self._estimators_loaded:
+                return
+            if not os.path.exists(self._estimators_path):
+                raise RuntimeError(
+                    f"{self._estimators_path} was removed by a newer training run; "
+                    "restart the service to load the current model"
+                )
+            saved_models = joblib.load(self._estimators_path, mmap_mode='r')
+            self.models = {name: saved_models[name] for name in self.models}
+            self._ordered_models = list(self.models.values())
+            self._estimators_loaded = True
+            logger.info("Loaded ensemble estimators")
+    
+    def _load_backend(self):
+        """Attach compiled/ONNX backends for the ensemble and the student"""
+        self._backend = self._select_backend(list(self.models))
+        self._student_backend = self._select_backend(['student']) if self.student is not None else None
+        self._fil = None
+    
+    def _select_backend(self, names: List[str]):
+        """
+        Pick the fastest inference backend whose artifacts cover every name:
+        Treelite compiled libraries, then ONNX Runtime, then None (native predict)
+        """
+        candidates = [
+            ("Treelite compiled models", TREELITE_AVAILABLE, self.compiled_paths, CompiledEnsemble),
+            ("ONNX Runtime", ONNX_AVAILABLE, self.onnx_paths, OnnxEnsemble),
+        ]
+        for label, available, paths, backend in candidates:
+            if not available or not set(names) <= set(paths):
+                continue
+            try:
+                selected = backend([paths[name] for name in names])
+                logger.info(f"Using {label} for {', '.join(names)}")
+                return selected
+            except Exception as e:
+                logger.warning(f"Could not load {label}: {e}")
+        return None
+    
+    def _distill(self, X_scaled: np.ndarray):
+        """
+        Fit a single LightGBM regressor on the ensemble's soft labels
+        
+        One 300-tree model replaces 600 trees across three models at
+        inference time, at a small cost in ranking quality.
+        """
+        logger.info("Distilling ensemble into student model...")
+        self.student = None
+        soft_labels = self._ensemble_proba(X_scaled)
+        
+        self.student = LGBMRegressor(
+            n_estimators=300,
+            max_depth=8,
+            learning_rate=0.05,
+            n_jobs=1,
+            random_state=42,
+            verbose=-1
+        )
+        self.student.fit(X_scaled, soft_labels)
+    
+    def train(self, training_data: pd.DataFrame, labels: pd.Series, save: bool = True,
+              features: Optional[np.ndarray] = None):
         """
         Train the ensemble model
         
         Args:
             training_data: DataFrame with customer features
             labels: Series with NTL labels (0: honest, 1: theft)
+            save: Write the model to disk; pass False to save later with
+                extra metadata via _save_model(extra=...)
+            features: feature_engineer.transform(training_data), if the
+                caller has already computed it
         """
         logger.info("Starting model training...")
         
         # Feature engineering
-        X = self.feature_engineer.transform(training_data)
+        X = self.feature_engineer.transform(training_data) if features is None else features
         
-        # Handle class imbalance with SMOTE (less aggressive)
-        # Use sampling_strategy=0.3 to create fewer synthetic samples
-        # This prevents SMOTE from overwhelming real data patterns
+        # Class imbalance is handled by the models' own weighting
+        # (class_weight='balanced', scale_pos_weight) instead of SMOTE, which
+        # would materialize an oversampled copy of the feature matrix
         minority_class_count = int(labels.sum())
         majority_class_count = len(labels) - minority_class_count
         
-        print(f"Class distribution before SMOTE:")
+        print(f"Class distribution:")
         print(f"  Normal (0): {majority_class_count}")
         print(f"  NTL (1): {minority_class_count}")
         
-        # Only apply SMOTE if severe imbalance (ratio > 10:1)
-        if majority_class_count / (minority_class_count + 1) > 10:
-            # Create synthetic samples to bring minority to 30% of majority
-            smote = SMOTE(sampling_strategy=0.3, random_state=42, k_neighbors=5)
-            X_resampled, y_resampled = smote.fit_resample(X, labels)
-            print(f"Class distribution after SMOTE:")
-            print(f"  Normal (0): {(y_resampled == 0).sum()}")
-            print(f"  NTL (1): {(y_resampled == 1).sum()}")
-        else:
-            X_resampled, y_resampled = X, labels
-            print("Skipping SMOTE - class balance acceptable")
-        
-        # Scale features
-        X_scaled = self.scaler.fit_transform(X_resampled)
+        self.models['xgboost'].set_params(
+            scale_pos_weight=majority_class_count / max(minority_class_count, 1)
+        )
         
-        # Train each model in ensemble
-        for name, model in self.models.items():
-            logger.info(f"Training {name}...")
-            model.fit(X_scaled, y_resampled)
+        # Scale features (float32 - the dtype every ensemble member consumes)
+        self.scaler.fit(X)
+        self._cache_scaler()
+        X_scaled = self._scale(X)
+        
+        # Train the ensemble members in parallel worker processes; each
+        # model is single-threaded (n_jobs=1), so cores are not oversubscribed
+        logger.info(f"Training {', '.join(self.models)}...")
+        n_cpus = os.cpu_count() or 1
+        n_jobs = min(len(self.models), n_cpus)
+        
+        # The forest, the slowest member to fit, also gets the cores the
+        # other members leave idle; it is single-threaded again for serving
+        self.models['random_forest'].set_params(n_jobs=max(1, n_cpus - n_jobs + 1))
+        self.models = dict(Parallel(n_jobs=n_jobs, backend='loky')(
+            delayed(_fit_model)(name, model, X_scaled, labels) for name, model in self.models.items()
+        ))
+        self.models['random_forest'].set_params(n_jobs=1)
+        self._estimators_loaded = True
         
         self.is_trained = True
+        # Artifacts on disk describe the previous models (and student) until
+        # _save_model rebuilds them
+        self._backend = self._student_backend = None
+        self.onnx_paths = {}
+        self.compiled_paths = {}
+        self._refresh_ensemble()
+        self._distill(X_scaled)
         logger.info("Model training completed")
         
         # Save model
-        self._save_model()
+        if save:
+            self._save_model()
     
     def predict_single(self, customer_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Predict NTL for a single customer
         
+        Results are cached (LRU) on the full request content, so repeated
+        queries for an unchanged customer skip the model entirely.
+        
         Returns:
             Dictionary with prediction results
         """
-        # Convert to DataFrame for feature engineering
-        df = pd.DataFrame([customer_data])
-        
-        # Extract features
-        features = self.feature_engineer.transform(df)
-        features_scaled = self.scaler.transform(features)
-        
-        # Ensemble prediction (weighted average)
-        predictions = []
-        for name, model in self.models.items():
-            prob = model.predict_proba(features_scaled)[0][1]  # Probability of theft
-            predictions.append(prob * self.model_weights[name])
-        
-        confidence_score = sum(predictions) * 100  # Convert to percentage
-        
-        # Identify theft indicators
-        theft_indicators = self._identify_theft_patterns(customer_data, features)
+        return self.predict_many([customer_data])[0]
+    
+    def predict_many(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Predict NTL for several customers with one ensemble call
         
-        # Estimate monthly loss (based on consumption anomaly)
-        estimated_loss = self._estimate_monthly_loss(customer_data, confidence_score)
+        Cached records are answered directly; the rest are featurized,
+        scaled and scored together, so N concurrent requests cost one
+        model dispatch instead of N.
         
-        # Risk classification
-        if confidence_score >= 75:
-            risk_level = "High"
-            action = "Immediate field inspection with legal team standby"
-        elif confidence_score >= 50:
-            risk_level = "Medium"
-            action = "Schedule inspection within 3 days"
-        else:
-            risk_level = "Low"
-            action = "Monitor for 30 days, flag if pattern continues"
+        Returns:
+            List of prediction dictionaries, in the same order as records
+        """
+        keys = [self._cache_key(record) for record in records]
+        results = [self._cache_get(key) for key in keys]
+        misses = [i for i, result in enumerate(results) if result is None]
         
+        if misses:
+            # Extract features straight from the dicts (no DataFrame round-trip)
+            features = np.vstack([self.feature_engineer.transform_one(records[i]) for i in misses])
+            
+            # Ensemble prediction (weighted average), as a percentage
+            scores = self._ensemble_proba(self._scale(features)) * 100
+            
+            # Indicators and loss estimates for the whole batch at once
+            batch = [records[i] for i in misses]
+            stats = self._history_stats([record.get("consumption_history") or [] for record in batch])
+            masks = self._identify_theft_patterns_batch(batch, stats)
+            losses = self._estimate_monthly_loss_batch(stats, scores)
+            buckets = risk_buckets(scores)
+            
+            for row, i in enumerate(misses):
+                prediction = self._build_prediction(
+                    records[i],
+                    float(scores[row]),
+                    float(losses[row]),
+                    list(_INDICATORS_BY_MASK[masks[row]]),
+                    int(buckets[row])
+                )
+                self._cache_put(keys[i], prediction)
+                results[i] = prediction
+        
+        return [dict(result, theft_indicators=list(result["theft_indicators"])) for result in results]
+    
+    @staticmethod
+    def _cache_key(customer_data: Dict[str, Any]) -> tuple:
+        """Hashable key built from every field of the request"""
+        def freeze(value):
+            if isinstance(value, dict):
+                return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+            if isinstance(value, (list, tuple, np.ndarray)):
+                return tuple(freeze(v) for v in value)
+            return value
+        
+        return freeze(customer_data)
+    
+    def _cache_get(self, key: tuple):
+        with self._cache_lock:
+            cached = self._prediction_cache.get(key)
+            if cached is not None:
+                self._prediction_cache.move_to_end(key)
+            return cached
+    
+    def _cache_put(self, key: tuple, prediction: Dict[str, Any]):
+        with self._cache_lock:
+            self._prediction_cache[key] = prediction
+            if len(self._prediction_cache) > PREDICTION_CACHE_SIZE:
+                self._prediction_cache.popitem(last=False)
+    
+    def _build_prediction(self, customer_data: Dict[str, Any], confidence_score: float,
+                          estimated_loss: float, theft_indicators: List[str],
+                          risk_bucket: int) -> Dict[str, Any]:
+        """Assemble the prediction payload for one customer (risk_bucket from risk_buckets)"""
         return {
             "customer_id": customer_data["customer_id"],
             "confidence_score": round(confidence_score, 2),
             "estimated_monthly_loss": round(estimated_loss, 2),
             "theft_indicators": theft_indicators,
-            "risk_level": risk_level,
-            "recommended_action": action
+            "risk_level": RISK_LEVELS[risk_bucket],
+            "recommended_action": RISK_ACTIONS[risk_bucket]
         }
     
     def predict_batch(self, customer_ids: List[str], date: str) -> List[Dict[str, Any]]:
@@ -216,44 +551,58 @@ class NTLDetector:
         
         return predictions
     
-    def _identify_theft_patterns(self, customer_data: Dict, features: np.ndarray) -> List[str]:
+    @staticmethod
+    def _history_stats(histories: List[List[float]]) -> Dict[str, np.ndarray]:
+        """
+        Length, total, last-3-month sum and last reading of each history
+        
+        The ragged histories are flattened into one buffer and summarized
+        with prefix sums, so no NumPy call is made per customer.
+        """
+        lengths = np.fromiter((len(c) for c in histories), dtype=np.int64, count=len(histories))
+        flat = np.fromiter(chain.from_iterable(histories), dtype=np.float64, count=int(lengths.sum()))
+        ends = np.cumsum(lengths)
+        prefix = np.concatenate(([0.0], np.cumsum(flat)))
+        
+        return {
+            "lengths": lengths,
+            "total": prefix[ends] - prefix[ends - lengths],
+            "recent_sum": prefix[ends] - prefix[ends - np.minimum(lengths, 3)],
+            "last": np.append(flat, 0.0)[np.where(lengths > 0, ends - 1, len(flat))],
+        }
+    
+    def _identify_theft_patterns_batch(self, records: List[Dict], stats: Dict[str, np.ndarray]) -> np.ndarray:
         """
         Identify specific theft indicators based on anomalies
+        
+        Returns:
+            uint8 array of indicator bitmasks (see THEFT_INDICATORS)
         """
-        indicators = []
+        lengths, total, recent_sum = stats["lengths"], stats["total"], stats["recent_sum"]
         
-        # Consumption anomaly
-        consumption = customer_data.get("consumption_history", [])
-        if len(consumption) >= 12:
-            recent_avg = np.mean(consumption[-3:])
-            historical_avg = np.mean(consumption[:-3])
-            
-            if recent_avg < historical_avg * 0.5:
-                indicators.append("Consumption dropped >50% vs. historical average")
+        # Consumption anomaly: last 3 months under half the earlier average
+        recent_avg = recent_sum / 3
+        historical_avg = (total - recent_sum) / np.maximum(lengths - 3, 1)
+        dropped = (lengths >= 12) & (recent_avg < historical_avg * 0.5)
         
         # AMI tamper detection
-        ami_data = customer_data.get("ami_data", {})
-        if ami_data:
-            if ami_data.get("tamper_alerts", 0) > 0:
-                indicators.append("AMI tamper alerts detected")
-            
-            voltage = ami_data.get("voltage_reading", 220)
-            if voltage < 200:
-                indicators.append("Abnormal voltage drop (possible bypass)")
+        ami = [record.get("ami_data") or {} for record in records]
+        tampered = np.array([data.get("tamper_alerts", 0) > 0 for data in ami], dtype=bool)
+        low_voltage = np.array([data.get("voltage_reading", 220) < 200 for data in ami], dtype=bool)
         
         # Profile mismatch
-        customer_type = customer_data.get("customer_type")
-        avg_consumption = np.mean(consumption) if consumption else 0
-        
-        if customer_type == "residential" and avg_consumption > 1000:
-            indicators.append("Residential account with commercial-level consumption")
-        
-        if not indicators:
-            indicators.append("Statistical anomaly detected in consumption pattern")
-        
-        return indicators
+        residential = np.array([record.get("customer_type") == "residential" for record in records], dtype=bool)
+        avg_consumption = total / np.maximum(lengths, 1)
+        commercial_level = residential & (avg_consumption > 1000)
+        
+        return (
+            dropped.astype(np.uint8)
+            | tampered.astype(np.uint8) << 1
+            | low_voltage.astype(np.uint8) << 2
+            | commercial_level.astype(np.uint8) << 3
+        )
     
-    def _estimate_monthly_loss(self, customer_data: Dict, confidence_score: float) -> float:
+    def _estimate_monthly_loss_batch(self, stats: Dict[str, np.ndarray], confidence_scores: np.ndarray) -> np.ndarray:
         """
         Estimate monthly revenue loss in PHP
         
@@ -261,33 +610,33 @@ class NTLDetector:
         - Average rate: ₱10/kWh (blended residential/commercial)
         - Theft typically involves 50-80% of actual consumption
         """
-        consumption = customer_data.get("consumption_history", [])
-        
-        if not consumption:
-            return 0
+        lengths, total, recent_sum = stats["lengths"], stats["total"], stats["recent_sum"]
         
         # Calculate expected vs. actual consumption
-        historical_avg = np.mean(consumption[:-3]) if len(consumption) > 3 else np.mean(consumption)
-        current_consumption = np.mean(consumption[-3:]) if len(consumption) >= 3 else consumption[-1]
+        historical_avg = np.where(
+            lengths > 3,
+            (total - recent_sum) / np.maximum(lengths - 3, 1),
+            total / np.maximum(lengths, 1)
+        )
+        current_consumption = np.where(lengths >= 3, recent_sum / 3, stats["last"])
         
         # Estimated stolen kWh
-        stolen_kwh = max(0, historical_avg - current_consumption)
+        stolen_kwh = np.maximum(0, historical_avg - current_consumption)
         
-        # Apply confidence factor
-        adjusted_theft = stolen_kwh * (confidence_score / 100)
+        # Apply confidence factor and convert to PHP (₱10/kWh average blended rate)
+        monthly_loss = stolen_kwh * (confidence_scores / 100) * 10
         
-        # Convert to PHP (₱10/kWh average blended rate)
-        monthly_loss = adjusted_theft * 10
-        
-        return monthly_loss
+        return np.where(lengths > 0, monthly_loss, 0.0)
     
-    def evaluate(self, X_test: pd.DataFrame, y_test: pd.Series) -> Dict[str, Any]:
+    def evaluate(self, X_test: pd.DataFrame, y_test: pd.Series,
+                 features: Optional[np.ndarray] = None) -> Dict[str, Any]:
         """
         Evaluate model performance on test data
         
         Args:
             X_test: Test features DataFrame
             y_test: Test labels Series
+            features: feature_engineer.transform(X_test), if already computed
             
         Returns:
             Dictionary with evaluation metrics
@@ -298,21 +647,10 @@ class NTLDetector:
         )
         
         # Transform and scale test data
-        X_features = self.feature_engineer.transform(X_test)
-        X_scaled = self.scaler.transform(X_features)
-        
-        # Get ensemble predictions
-        all_predictions = []
-        all_probabilities = []
-        
-        for name, model in self.models.items():
-            preds = model.predict(X_scaled)
-            probs = model.predict_proba(X_scaled)[:, 1]
-            all_predictions.append(preds)
-            all_probabilities.append(probs)
+        X_scaled = self.featurize_batch(X_test) if features is None else self._scale(features)
         
         # Weighted ensemble predictions
-        weighted_probs = sum(prob * weight for prob, weight in zip(all_probabilities, self.model_weights.values()))
+        weighted_probs = self._ensemble_proba(X_scaled)
         
         # Use higher threshold to reduce false positives
         # Since we have severe class imbalance, threshold should be tuned
@@ -335,44 +673,128 @@ class NTLDetector:
         
         return metrics
     
-    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+    def predict_proba(self, X: pd.DataFrame, features: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Get probability predictions for NTL detection
         
         Args:
             X: Features DataFrame
+            features: feature_engineer.transform(X), if already computed
             
         Returns:
             Array of probabilities for each class [prob_normal, prob_theft]
         """
         # Transform and scale features
-        X_features = self.feature_engineer.transform(X)
-        X_scaled = self.scaler.transform(X_features)
+        X_scaled = self.featurize_batch(X) if features is None else self._scale(features)
         
         # Get ensemble probabilities using proper weighted average
-        ensemble_probs = np.zeros((X_scaled.shape[0], 2))
+        theft_probs = None
+        if FIL_AVAILABLE and self.is_trained and len(X_scaled) >= GPU_MIN_BATCH:
+            try:
+                theft_probs = self.predict_proba_gpu(X_scaled)
+            except Exception as e:
+                logger.warning(f"GPU inference failed, using CPU: {e}")
+        if theft_probs is None:
+            theft_probs = self._ensemble_proba(X_scaled)
         
-        for name, model in self.models.items():
-            probs = model.predict_proba(X_scaled)
-            # Add weighted contribution to ensemble
-            ensemble_probs += probs * self.model_weights[name]
+        return np.column_stack([self._weight_vec.sum() - theft_probs, theft_probs])
+    
+    def predict_proba_gpu(self, X_scaled: np.ndarray) -> np.ndarray:
+        """
+        GPU (RAPIDS FIL) equivalent of _ensemble_proba for large batches
         
-        return ensemble_probs
+        Requires cuML; see fil_backend.
+        """
+        distilled = USE_DISTILLED_MODEL and self.student is not None
+        if self._fil is None:
+            if not distilled:
+                self._ensure_estimators()
+            models = {'student': self.student} if distilled else self.models
+            self._fil = FilEnsemble(models, MODEL_DIR)
+        
+        if distilled:
+            return np.clip(self._fil.predict(X_scaled, [1.0]), 0.0, 1.0)
+        return self._fil.predict(X_scaled, self._weight_vec.tolist())
     
-    def _save_model(self):
-        """Save trained model to disk"""
-        os.makedirs("model/saved_models", exist_ok=True)
+    def _save_model(self, extra: Optional[Dict[str, Any]] = None):
+        """
+        Save trained model to disk
+        
+        Args:
+            extra: Additional entries stored in the pickle (e.g. metrics)
+        """
+        trained_date = datetime.now()
+        artifacts_dir = f"{ARTIFACTS_DIR_PREFIX}{trained_date:%Y%m%d_%H%M%S_%f}"
+        save_dir = os.path.join(MODEL_DIR, artifacts_dir)
+        os.makedirs(save_dir, exist_ok=True)
+        served_models = dict(self.models)
+        if self.student is not None:
+            served_models['student'] = self.student
+        
+        # ONNX copies of each model for inference serving (optional)
+        self.onnx_paths = {}
+        if ONNX_AVAILABLE:
+            try:
+                self.onnx_paths = export_models(served_models, self.scaler.n_features_in_, save_dir)
+            except Exception as e:
+                logger.warning(f"ONNX export failed, serving native models: {e}")
+        
+        # Natively compiled copies with quantized thresholds (optional)
+        self.compiled_paths = {}
+        if TREELITE_AVAILABLE:
+            try:
+                self.compiled_paths = compile_models(served_models, save_dir)
+            except Exception as e:
+                logger.warning(f"Treelite compilation failed: {e}")
+        
+        # The estimators get their own pickle so loading the service
+        # doesn't unpickle them; see _ensure_estimators
+        estimators_file = os.path.join(artifacts_dir, ESTIMATORS_FILE)
+        joblib.dump(self.models, os.path.join(MODEL_DIR, estimators_file), **MODEL_DUMP_KWARGS)
         
         save_data = {
-            'models': self.models,
+            'model_names': list(self.models),
+            'artifacts_dir': artifacts_dir,
+            'estimators_file': estimators_file,
             'scaler': self.scaler,
             'weights': self.model_weights,
+            'student': self.student,
+            'onnx_models': self.onnx_paths,
+            'compiled_models': self.compiled_paths,
             'version': self.model_version,
-            'trained_date': datetime.now().isoformat()
+            'trained_date': trained_date.isoformat(),
+            **(extra or {})
         }
         
-        joblib.dump(save_data, "model/saved_models/ensemble_model.pkl")
+        # Write then rename, so a concurrently starting process reads either
+        # the old MODEL_PATH or the new one, never a partial file
+        tmp_path = f"{MODEL_PATH}.tmp"
+        joblib.dump(save_data, tmp_path, **MODEL_DUMP_KWARGS)
+        os.replace(tmp_path, MODEL_PATH)
         logger.info("Model saved successfully")
+        
+        # Only now that MODEL_PATH names the new artifacts can older ones go;
+        # the previous save's are kept for processes still serving it
+        previous = self._artifacts_dir
+        self._artifacts_dir = artifacts_dir
+        self._estimators_path = os.path.join(MODEL_DIR, estimators_file)
+        self._remove_stale_artifacts(keep={artifacts_dir, previous})
+        self._load_backend()
+    
+    @staticmethod
+    def _remove_stale_artifacts(keep):
+        """Delete artifacts from saves older than the entries in keep"""
+        for filename in os.listdir(MODEL_DIR):
+            if filename in keep:
+                continue
+            path = os.path.join(MODEL_DIR, filename)
+            try:
+                if filename.startswith(ARTIFACTS_DIR_PREFIX) and os.path.isdir(path):
+                    shutil.rmtree(path)
+                elif filename.startswith(LEGACY_ESTIMATORS_PREFIX):
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Could not remove {path}: {e}")
     
     def get_model_info(self) -> Dict[str, Any]:
         """Return model metadata and performance metrics"""
@@ -381,6 +803,7 @@ class NTLDetector:
             "is_trained": self.is_trained,
             "models": list(self.models.keys()),
             "model_weights": self.model_weights,
+            "distilled": USE_DISTILLED_MODEL and self.student is not None,
             "feature_count": len(self.feature_engineer.feature_names),
             "status": "operational" if self.is_trained else "requires_training"
         }
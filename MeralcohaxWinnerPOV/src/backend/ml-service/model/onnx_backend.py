@@ -0,0 +1,94 @@
+"""
+ONNX Runtime inference backend for the NTL ensemble
+
+Each trained model is exported to its own .onnx file next to the joblib
+pickle and served through an onnxruntime InferenceSession. The ONNX stack
+(onnxruntime, skl2onnx, onnxmltools) is optional: when it is missing
+ONNX_AVAILABLE is False and NTLDetector keeps using the native models.
+"""
+
+import os
+import numpy as np
+from typing import Dict, List
+
+try:
+    import onnxruntime as ort
+    import onnxmltools
+    from onnxmltools.convert.common.data_types import FloatTensorType as MLFloatTensorType
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType
+    from xgboost import XGBClassifier
+    from lightgbm import LGBMClassifier, LGBMRegressor
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+def export_models(models: Dict[str, object], n_features: int, model_dir: str) -> Dict[str, str]:
+    """
+    Export every fitted model to ONNX
+
+    Args:
+        models: Fitted ensemble members keyed by name
+        n_features: Width of the scaled feature matrix
+        model_dir: Directory to write <name>.onnx files into
+
+    Returns:
+        Dictionary of model name -> .onnx path
+    """
+    # skl2onnx and onnxmltools each insist on their own tensor type class
+    sklearn_types = [('X', FloatTensorType([None, n_features]))]
+    booster_types = [('X', MLFloatTensorType([None, n_features]))]
+    paths = {}
+
+    for name, model in models.items():
+        if isinstance(model, XGBClassifier):
+            onnx_model = onnxmltools.convert_xgboost(model, initial_types=booster_types)
+        elif isinstance(model, (LGBMClassifier, LGBMRegressor)):
+            onnx_model = onnxmltools.convert_lightgbm(model, initial_types=booster_types, zipmap=False)
+        else:
+            onnx_model = convert_sklearn(
+                model,
+                initial_types=sklearn_types,
+                options={id(model): {'zipmap': False}}
+            )
+
+        path = os.path.join(model_dir, f"{name}.onnx")
+        with open(path, "wb") as f:
+            f.write(onnx_model.SerializeToString())
+        paths[name] = path
+
+    return paths
+
+
+class OnnxEnsemble:
+    """
+    One InferenceSession per ensemble member
+
+    Sessions run single-threaded: model-level parallelism comes from
+    serving several requests at once, not from splitting one tiny input.
+    """
+
+    def __init__(self, paths: List[str]):
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = 1
+        options.inter_op_num_threads = 1
+
+        self.sessions = []
+        for path in paths:
+            session = ort.InferenceSession(path, sess_options=options, providers=['CPUExecutionProvider'])
+            # Classifiers emit [label, probabilities], regressors a single variable
+            self.sessions.append((session, session.get_inputs()[0].name, session.get_outputs()[-1].name))
+
+    def predict_proba(self, X_scaled: np.ndarray) -> np.ndarray:
+        """
+        Probability of theft from every model (raw output for regressors)
+
+        Returns:
+            Array of shape (n_models, n_samples)
+        """
+        X32 = np.ascontiguousarray(X_scaled, dtype=np.float32)
+        return np.array([
+            session.run([output], {input_name: X32})[0][:, -1]
+            for session, input_name, output in self.sessions
+        ])
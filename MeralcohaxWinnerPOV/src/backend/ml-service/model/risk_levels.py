@@ -0,0 +1,28 @@
+"""
+Risk levels and recommended actions for NTL confidence scores
+
+Kept free of the ML dependencies so lightweight tools (e.g. the demo data
+generator) can bucket scores the same way as NTLDetector.
+"""
+
+import numpy as np
+
+# a confidence score >= RISK_THRESHOLDS[i] is at least RISK_LEVELS[i + 1]
+RISK_THRESHOLDS = (50.0, 75.0)
+RISK_LEVELS = ("Low", "Medium", "High")
+RISK_ACTIONS = (
+    "Monitor for 30 days, flag if pattern continues",
+    "Schedule inspection within 3 days",
+    "Immediate field inspection with legal team standby",
+)
+
+
+def risk_buckets(confidence_scores) -> np.ndarray:
+    """
+    Index into RISK_LEVELS / RISK_ACTIONS for each confidence score (0-100)
+    
+    Non-finite scores (e.g. NaN from a degenerate feature row) are Low, so
+    they never reach the inspection hotlist.
+    """
+    scores = np.asarray(confidence_scores, dtype=np.float64)
+    return np.where(np.isfinite(scores), np.searchsorted(RISK_THRESHOLDS, scores, side='right'), 0)
@@ -0,0 +1,131 @@
+"""
+Treelite compiled inference backend for the NTL ensemble
+
+Each trained model is translated by Treelite and compiled by TL2cgen into
+a native shared library with quantized split thresholds: feature values
+are mapped to integer bin indices once per row, so node tests compare
+small integers instead of floating point thresholds. Both packages and a
+C toolchain are optional; when missing TREELITE_AVAILABLE is False.
+
+LightGBM boosters are compiled with lleaves (LLVM) instead when it is
+installed, falling back to Treelite if lleaves cannot compile them.
+"""
+
+import logging
+import os
+import numpy as np
+from typing import Dict, List
+
+try:
+    import treelite
+    import tl2cgen
+    from xgboost import XGBClassifier
+    from lightgbm import LGBMClassifier, LGBMRegressor
+    TREELITE_AVAILABLE = True
+except ImportError:
+    TREELITE_AVAILABLE = False
+
+try:
+    import lleaves
+    LLEAVES_AVAILABLE = True
+except ImportError:
+    LLEAVES_AVAILABLE = False
+
+logger = logging.getLogger("KILOS")
+
+LLEAVES_SUFFIX = "_lleaves.so"
+
+
+def compile_models(models: Dict[str, object], model_dir: str, quantize: bool = True) -> Dict[str, str]:
+    """
+    Compile every fitted model to a shared library
+
+    Args:
+        models: Fitted ensemble members keyed by name
+        model_dir: Directory to write <name>_treelite.so files into
+        quantize: Quantize split thresholds into integer bins
+
+    Returns:
+        Dictionary of model name -> library path (<name>_lleaves.so for
+        LightGBM models compiled by lleaves)
+    """
+    params = {
+        'quantize': 1 if quantize else 0,
+        'parallel_comp': os.cpu_count() or 1
+    }
+    paths = {}
+
+    for name, model in models.items():
+        if LLEAVES_AVAILABLE and isinstance(model, (LGBMClassifier, LGBMRegressor)):
+            try:
+                paths[name] = _compile_lleaves(model, name, model_dir)
+                continue
+            except Exception as e:
+                logger.warning(f"lleaves compilation of {name} failed, using Treelite: {e}")
+
+        if isinstance(model, XGBClassifier):
+            tl_model = treelite.frontend.from_xgboost(model.get_booster())
+        elif isinstance(model, (LGBMClassifier, LGBMRegressor)):
+            tl_model = treelite.frontend.from_lightgbm(model.booster_)
+        else:
+            tl_model = treelite.sklearn.import_model(model)
+
+        path = os.path.join(model_dir, f"{name}_treelite.so")
+        tl2cgen.export_lib(tl_model, toolchain='gcc', libpath=path, params=params)
+        paths[name] = path
+
+    return paths
+
+
+def _compile_lleaves(model, name: str, model_dir: str) -> str:
+    """Compile a fitted LightGBM model with lleaves; returns the library path"""
+    model_file = os.path.join(model_dir, f"{name}_lgbm.txt")
+    model.booster_.save_model(model_file)
+    path = os.path.join(model_dir, f"{name}{LLEAVES_SUFFIX}")
+    # float32 kernels read the scaled feature matrix as-is, without a float64 copy
+    lleaves.Model(model_file=model_file).compile(cache=path, use_fp64=False)
+    return path
+
+
+class _LleavesPredictor:
+    """lleaves model loaded from its cached library, single-threaded"""
+
+    def __init__(self, path: str):
+        model_file = path[:-len(LLEAVES_SUFFIX)] + "_lgbm.txt"
+        self.model = lleaves.Model(model_file=model_file)
+        self.model.compile(cache=path, use_fp64=False)  # Loads the existing library
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        # lleaves applies the objective's link function (sigmoid for binary)
+        return self.model.predict(np.ascontiguousarray(X, dtype=np.float32), n_jobs=1)
+
+
+class _TreelitePredictor:
+    """Single-threaded TL2cgen Predictor"""
+
+    def __init__(self, path: str):
+        self.predictor = tl2cgen.Predictor(path, nthread=1)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        dmat = tl2cgen.DMatrix(np.ascontiguousarray(X, dtype=np.float32))
+        # Binary boosters emit one column (theft), sklearn forests emit two
+        return self.predictor.predict(dmat).reshape(X.shape[0], -1)[:, -1]
+
+
+class CompiledEnsemble:
+    """One compiled predictor (lleaves or TL2cgen) per ensemble member"""
+
+    def __init__(self, paths: List[str]):
+        self.predictors = [
+            _LleavesPredictor(path) if path.endswith(LLEAVES_SUFFIX) else _TreelitePredictor(path)
+            for path in paths
+        ]
+
+    def predict_proba(self, X_scaled: np.ndarray) -> np.ndarray:
+        """
+        Probability of theft from every model
+
+        Returns:
+            Array of shape (n_models, n_samples)
+        """
+        return np.array([predictor.predict(X_scaled) for predictor in self.predictors])
@@ -11,26 +11,71 @@ from datetime import datetime
 import mysql.connector
 from dotenv import load_dotenv
 
+# mysqlclient (MySQLdb) is an optional C driver; mysql.connector is the fallback
+try:
+    import MySQLdb
+    import MySQLdb.cursors
+    MYSQLCLIENT_AVAILABLE = True
+except ImportError:
+    MYSQLCLIENT_AVAILABLE = False
+
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from model.ntl_detector import NTLDetector
+from model.ntl_detector import NTLDetector, MODEL_PATH
 from model.feature_engineering import FeatureEngineer
 
 # Load environment variables
 load_dotenv()
 
+# Database driver: 'mysqlclient' (when installed) or 'connector' (mysql.connector)
+DB_DRIVER = os.getenv('KILOS_DB_DRIVER', 'mysqlclient')
+
+# Rows per multi-row INSERT when staging predictions for the DB update
+UPDATE_BATCH_SIZE = 10_000
+
+# customers.risk_level buckets: a score >= DB_RISK_THRESHOLDS[i] is at
+# least DB_RISK_LEVELS[i + 1]
+DB_RISK_THRESHOLDS = (40.0, 60.0, 80.0)
+DB_RISK_LEVELS = np.array(['low', 'medium', 'high', 'critical'])
+
+# Print prediction diagnostics and read back a few updated rows
+DEBUG = os.getenv('KILOS_DEBUG', '0') == '1'
+
+# Customers per chunk when streaming the training query
+READ_CHUNK_SIZE = 50_000
+
+# Most recent monthly readings pivoted into kwh_m1 (oldest) .. kwh_m12 (latest)
+HISTORY_MONTHS = 12
+KWH_COLUMNS = [f'kwh_m{month}' for month in range(1, HISTORY_MONTHS + 1)]
+
 def connect_to_database():
-    """Connect to MySQL database"""
+    """
+    Connect to MySQL database
+    
+    Uses the C-based mysqlclient driver when installed (faster bulk
+    executemany writes); set KILOS_DB_DRIVER=connector to use
+    mysql.connector instead. Both use the %s paramstyle and unbuffered
+    cursors, so fetch_training_data's chunked read streams from the server.
+    """
+    params = dict(
+        host=os.getenv('DB_HOST', 'localhost'),
+        user=os.getenv('DB_USER', 'root'),
+        password=os.getenv('DB_PASSWORD', ''),
+        database=os.getenv('DB_NAME', 'project_kilos'),
+        autocommit=True  # Ensure updates are committed automatically
+    )
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            user=os.getenv('DB_USER', 'root'),
-            password=os.getenv('DB_PASSWORD', ''),
-            database=os.getenv('DB_NAME', 'project_kilos'),
-            autocommit=True  # Ensure updates are committed automatically
-        )
-        print("✅ Connected to MySQL database")
+        if DB_DRIVER == 'mysqlclient' and MYSQLCLIENT_AVAILABLE:
+            # SSCursor: the default MySQLdb cursor buffers the whole result
+            connection = MySQLdb.connect(
+                charset='utf8mb4', cursorclass=MySQLdb.cursors.SSCursor, **params
+            )
+            driver = "mysqlclient"
+        else:
+            connection = mysql.connector.connect(**params)
+            driver = "mysql.connector"
+        print(f"✅ Connected to MySQL database ({driver})")
         return connection
     except Exception as e:
         print(f"❌ Database connection error: {e}")
@@ -42,8 +87,21 @@ def fetch_training_data(connection):
     """
     print("\n📊 Fetching training data from database...")
     
-    # Query to get customers with their consumption patterns from actual monthly readings
-    query = """
+    # Query to get customers with their last 12 monthly readings, pivoted
+    # into numeric columns (ranked newest first, so rn = 1 is kwh_m12)
+    kwh_pivot = ",\n        ".join(
+        f"MAX(CASE WHEN cr.rn = {HISTORY_MONTHS + 1 - month} THEN cr.kwh_consumed END) as {column}"
+        for month, column in enumerate(KWH_COLUMNS, start=1)
+    )
+    query = f"""
+    WITH ranked_readings AS (
+        SELECT
+            customer_id,
+            kwh_consumed,
+            ROW_NUMBER() OVER (PARTITION BY customer_id ORDER BY reading_date DESC) as rn,
+            COUNT(*) OVER (PARTITION BY customer_id) as total_readings
+        FROM consumption_readings
+    )
     SELECT 
         c.customer_id,
         c.customer_type,
@@ -61,27 +119,26 @@ def fetch_training_data(connection):
         t.anomaly_count as transformer_anomalies,
         f.area,
         f.feeder_name,
-        GROUP_CONCAT(cr.kwh_consumed ORDER BY cr.reading_date SEPARATOR ',') as consumption_history,
-        GROUP_CONCAT(cr.billing_amount_php ORDER BY cr.reading_date SEPARATOR ',') as billing_history,
-        COUNT(DISTINCT cr.reading_id) as total_readings
+        {kwh_pivot},
+        MAX(cr.total_readings) as total_readings
     FROM customers c
     LEFT JOIN transformers t ON c.transformer_id = t.transformer_id
     LEFT JOIN feeders f ON t.feeder_id = f.feeder_id
-    LEFT JOIN consumption_readings cr ON c.customer_id = cr.customer_id
+    JOIN ranked_readings cr ON c.customer_id = cr.customer_id AND cr.rn <= {HISTORY_MONTHS}
     WHERE c.is_active = TRUE
     GROUP BY c.customer_id
-    HAVING total_readings >= 12
+    HAVING total_readings >= {HISTORY_MONTHS}
     """
     
-    df = pd.read_sql(query, connection)
-    
-    # Convert consumption_history string to array of floats
-    df['consumption_array'] = df['consumption_history'].apply(
-        lambda x: [float(v) for v in x.split(',')] if pd.notna(x) and x else []
-    )
-    df['billing_array'] = df['billing_history'].apply(
-        lambda x: [float(v) for v in x.split(',')] if pd.notna(x) and x else []
-    )
+    # Stream the result in chunks; each chunk's kWh columns become one
+    # (rows, 12) float matrix whose rows are the per-customer histories
+    chunks = []
+    for chunk in pd.read_sql(query, connection, chunksize=READ_CHUNK_SIZE):
+        consumption = chunk[KWH_COLUMNS].to_numpy(dtype=np.float64)
+        chunk = chunk.drop(columns=KWH_COLUMNS)
+        chunk['consumption_array'] = list(consumption)
+        chunks.append(chunk)
+    df = pd.concat(chunks, ignore_index=True)
     
     print(f"✓ Fetched {len(df)} customer records with complete 12-month history")
     
@@ -107,6 +164,10 @@ def prepare_features(df):
 def train_and_evaluate(df):
     """
     Train the ML model
+    
+    Returns:
+        (detector, metrics, features) - features is the unscaled feature
+        matrix for every row of df, reused by update_predictions_in_db
     """
     print("\n🤖 Training NTL Detection Model...")
     print("=" * 60)
@@ -116,28 +177,33 @@ def train_and_evaluate(df):
     
     y = df['is_ntl']
     
-    # Split maintaining the full dataframe for feature engineering
-    train_df, test_df = train_test_split(
-        df, test_size=0.2, random_state=42, stratify=y
+    # Initialize model
+    detector = NTLDetector()
+    
+    # Feature engineering runs once over every customer; the training,
+    # evaluation and database-update steps all slice this one matrix
+    features = detector.feature_engineer.transform(df)
+    
+    # Split row positions, keeping the full dataframe for each side
+    train_idx, test_idx = train_test_split(
+        np.arange(len(df)), test_size=0.2, random_state=42, stratify=y
     )
+    train_df, test_df = df.iloc[train_idx], df.iloc[test_idx]
     
     print(f"Training set: {len(train_df)} samples")
     print(f"Test set: {len(test_df)} samples")
     
-    # Initialize and train model
-    detector = NTLDetector()
-    
     print("\nTraining ensemble models...")
     print("-" * 60)
     
-    # Pass raw dataframe - NTLDetector will do feature engineering
-    detector.train(train_df, train_df['is_ntl'])
+    # Saved below, once the metrics are known
+    detector.train(train_df, train_df['is_ntl'], save=False, features=features[train_idx])
     
     # Evaluate
     print("\n📈 Model Evaluation:")
     print("=" * 60)
     
-    metrics = detector.evaluate(test_df, test_df['is_ntl'])
+    metrics = detector.evaluate(test_df, test_df['is_ntl'], features=features[test_idx])
     
     print(f"\nOverall Accuracy: {metrics['accuracy']:.3f}")
     print(f"Precision: {metrics['precision']:.3f}")
@@ -153,107 +219,111 @@ def train_and_evaluate(df):
     
     # Save model
     print("\n💾 Saving trained model...")
-    model_dir = "model/saved_models"
-    os.makedirs(model_dir, exist_ok=True)
-    
-    import joblib
-    model_path = f"{model_dir}/ensemble_model.pkl"
-    joblib.dump({
-        'models': detector.models,
-        'scaler': detector.scaler,
-        'weights': detector.model_weights,
-        'version': detector.model_version,
+    detector._save_model(extra={
         'feature_engineer': detector.feature_engineer,
-        'trained_at': datetime.now().isoformat(),
         'metrics': metrics
-    }, model_path)
+    })
     
-    print(f"✓ Model saved to {model_path}")
+    print(f"✓ Model saved to {MODEL_PATH}")
     
-    return detector, metrics
+    return detector, metrics, features
 
-def update_predictions_in_db(connection, df, detector):
+def update_predictions_in_db(connection, df, detector, features=None):
     """
     Update customer records with ML predictions
+    
+    features: the unscaled feature matrix for df from train_and_evaluate;
+    computed here when not given
     """
     print("\n🔄 Updating predictions in database...")
     
-    # Get predictions for all customers - pass raw dataframe
-    predictions = detector.predict_proba(df)
+    # Get predictions for all customers
+    predictions = detector.predict_proba(df, features=features)
     
     if predictions is None or len(predictions) == 0:
         print("⚠️ No predictions generated, skipping database update")
         return
     
-    # Debug: Check prediction distribution
     ntl_probs = predictions[:, 1]
-    print(f"\n  [DEBUG] Prediction distribution:")
-    print(f"    Min prob: {ntl_probs.min():.3f}, Max prob: {ntl_probs.max():.3f}")
-    print(f"    Mean prob: {ntl_probs.mean():.3f}, Std: {ntl_probs.std():.3f}")
-    print(f"    Unique values: {len(np.unique(ntl_probs))}")
     
-    # Update database
-    cursor = connection.cursor()
-    update_count = 0
+    # Risk score and level for every customer at once
+    risk_scores = ntl_probs * 100
+    risk_levels = DB_RISK_LEVELS[np.searchsorted(DB_RISK_THRESHOLDS, risk_scores, side='right')]
     
-    # Debug: Print first 10 predictions with their ORIGINAL risk_level
-    print("\n  [DEBUG] Sample predictions (showing seed risk_level vs ML prediction):")
-    for i in range(min(10, len(df))):
-        row = df.iloc[i]
-        ntl_prob = predictions[i][1]
-        risk_score = ntl_prob * 100
-        if risk_score >= 80:
-            ml_level = 'critical'
-        elif risk_score >= 60:
-            ml_level = 'high'
-        elif risk_score >= 40:
-            ml_level = 'medium'
-        else:
-            ml_level = 'low'
-        print(f"    {row['customer_id']}: seed={row['risk_level']}/{row['risk_score']:.1f} → ML={ml_level}/{risk_score:.1f} (prob={ntl_prob:.3f})")
+    if DEBUG:
+        print_prediction_summary(df, ntl_probs, risk_scores, risk_levels)
     
-    for i, (idx, row) in enumerate(df.iterrows()):
-        customer_id = row['customer_id']
-        ntl_prob = predictions[i][1]  # Probability of theft class (use i, not idx!)
-        
-        # Update risk_score and ntl_confidence with ML predictions
-        risk_score = ntl_prob * 100
-        
-        # Determine risk level
-        if risk_score >= 80:
-            risk_level = 'critical'
-        elif risk_score >= 60:
-            risk_level = 'high'
-        elif risk_score >= 40:
-            risk_level = 'medium'
-        else:
-            risk_level = 'low'
-        
-        cursor.execute("""
-            UPDATE customers 
-            SET risk_score = %s, 
-                risk_level = %s,
-                ntl_confidence = %s
-            WHERE customer_id = %s
-        """, (float(risk_score), risk_level, float(ntl_prob * 100), customer_id))
-        
-        # Debug: Check if update worked for first customer
-        if update_count == 0:
-            cursor.execute("SELECT risk_score, risk_level FROM customers WHERE customer_id = %s", (customer_id,))
-            result = cursor.fetchone()
-            print(f"\n  [DEBUG] First update verification:")
-            print(f"    Tried to set: score={risk_score:.1f}, level={risk_level}")
-            print(f"    Actually in DB: score={result[0]:.1f}, level={result[1]}")
-        
-        update_count += 1
-        
-        if update_count % 5000 == 0:
-            print(f"  Updated {update_count}/{len(df)} customers...")
+    # (customer_id, risk_score, risk_level, ntl_confidence) per customer;
+    # ntl_confidence is the same percentage as risk_score
+    scores = risk_scores.tolist()
+    rows = list(zip(df['customer_id'].tolist(), scores, risk_levels.tolist(), scores))
+    
+    # Stage predictions in a temporary table (executemany turns each batch
+    # into one multi-row INSERT), then apply them with a single joined UPDATE
+    cursor = connection.cursor()
+    cursor.execute("""
+        CREATE TEMPORARY TABLE ml_predictions (
+            customer_id VARCHAR(50) PRIMARY KEY,
+            risk_score DECIMAL(5, 2),
+            risk_level ENUM('low', 'medium', 'high', 'critical'),
+            ntl_confidence DECIMAL(5, 2)
+        )
+    """)
+    
+    for start in range(0, len(rows), UPDATE_BATCH_SIZE):
+        cursor.executemany("""
+            INSERT INTO ml_predictions (customer_id, risk_score, risk_level, ntl_confidence)
+            VALUES (%s, %s, %s, %s)
+        """, rows[start:start + UPDATE_BATCH_SIZE])
+        print(f"  Staged {min(start + UPDATE_BATCH_SIZE, len(rows))}/{len(df)} predictions...")
+    
+    cursor.execute("""
+        UPDATE customers c
+        JOIN ml_predictions p ON c.customer_id = p.customer_id
+        SET c.risk_score = p.risk_score,
+            c.risk_level = p.risk_level,
+            c.ntl_confidence = p.ntl_confidence
+    """)
+    cursor.execute("DROP TEMPORARY TABLE ml_predictions")
+    update_count = len(rows)
+    
+    if DEBUG and rows:
+        verify_updates(cursor, rows[:5])
     
     cursor.close()
     
     print(f"✓ Updated {update_count} customer predictions")
 
+def print_prediction_summary(df, ntl_probs, risk_scores, risk_levels):
+    """Print the prediction distribution and the first 10 predictions"""
+    print(f"\n  [DEBUG] Prediction distribution:")
+    print(f"    Min prob: {ntl_probs.min():.3f}, Max prob: {ntl_probs.max():.3f}")
+    print(f"    Mean prob: {ntl_probs.mean():.3f}, Std: {ntl_probs.std():.3f}")
+    print(f"    Unique values: {len(np.unique(ntl_probs))}")
+    
+    # First 10 predictions next to their ORIGINAL (seed) risk_level
+    print("\n  [DEBUG] Sample predictions (showing seed risk_level vs ML prediction):")
+    sample = df.head(10)
+    for customer_id, seed_level, seed_score, level, score, prob in zip(
+            sample['customer_id'], sample['risk_level'], sample['risk_score'],
+            risk_levels, risk_scores, ntl_probs):
+        print(f"    {customer_id}: seed={seed_level}/{seed_score:.1f} → ML={level}/{score:.1f} (prob={prob:.3f})")
+
+def verify_updates(cursor, rows):
+    """Read back a few updated customers with one SELECT and compare"""
+    placeholders = ', '.join(['%s'] * len(rows))
+    cursor.execute(f"""
+        SELECT customer_id, risk_score, risk_level FROM customers
+        WHERE customer_id IN ({placeholders})
+    """, [customer_id for customer_id, *_ in rows])
+    stored = {customer_id: (score, level) for customer_id, score, level in cursor.fetchall()}
+    
+    print(f"\n  [DEBUG] Update verification:")
+    for customer_id, risk_score, risk_level, _ in rows:
+        score, level = stored.get(customer_id, (float('nan'), None))
+        print(f"    {customer_id}: tried score={risk_score:.1f}, level={risk_level}; "
+              f"in DB score={float(score):.1f}, level={level}")
+
 def main():
     """
     Main training pipeline
@@ -274,10 +344,10 @@ def main():
         df = prepare_features(df)
         
         # Train model - pass raw dataframe
-        detector, metrics = train_and_evaluate(df)
+        detector, metrics, features = train_and_evaluate(df)
         
         # Update predictions in database
-        update_predictions_in_db(connection, df, detector)
+        update_predictions_in_db(connection, df, detector, features)
         
         print("\n" + "=" * 60)
         print("✅ MODEL TRAINING COMPLETE!")
@@ -3,9 +3,16 @@ Sample Data Generator for KILOS Demo
 Generates realistic NTL predictions for demonstration
 """
 
-import random
+import os
+import sys
+import numpy as np
 from datetime import datetime
 
+# Add service directory to path for imports when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model.risk_levels import RISK_ACTIONS, RISK_LEVELS, risk_buckets
+
 
 def generate_sample_hotlist(count=50):
     """Generate sample inspection hotlist for demo"""
@@ -24,58 +31,48 @@ def generate_sample_hotlist(count=50):
         "Voltage reading below 200V threshold"
     ]
     
-    hotlist = []
+    rng = np.random.default_rng()
+    rank = np.arange(count)
     
-    for i in range(count):
-        # Generate customer ID
-        customer_id = f"CUST-{random.randint(1000000, 9000000)}"
-        
-        # Generate confidence score (biased towards higher for top results)
-        if i < 10:
-            confidence = random.uniform(80, 98)
-        elif i < 30:
-            confidence = random.uniform(60, 85)
-        else:
-            confidence = random.uniform(45, 70)
-        
-        # Generate estimated monthly loss (PHP)
-        # Higher confidence = higher loss typically
-        base_loss = random.uniform(5000, 50000)
-        loss_multiplier = confidence / 50
-        estimated_loss = base_loss * loss_multiplier
-        
-        # Risk level
-        if confidence >= 75:
-            risk_level = "High"
-            action = "Immediate field inspection with legal team standby"
-        elif confidence >= 50:
-            risk_level = "Medium"
-            action = "Schedule inspection within 3 days"
-        else:
-            risk_level = "Low"
-            action = "Monitor for 30 days, flag if pattern continues"
-        
-        # Select 2-3 random theft indicators
-        num_indicators = random.randint(2, 3)
-        theft_indicators = random.sample(indicators_pool, num_indicators)
-        
+    # Generate customer IDs
+    customer_ids = rng.integers(1000000, 9000000, size=count, endpoint=True)
+    
+    # Generate confidence scores (biased towards higher for top results)
+    low = np.select([rank < 10, rank < 30], [80, 60], default=45)
+    high = np.select([rank < 10, rank < 30], [98, 85], default=70)
+    raw_confidence = rng.uniform(low, high)
+    confidence = np.round(raw_confidence, 2)
+    
+    # Generate estimated monthly loss (PHP)
+    # Higher confidence = higher loss typically
+    base_loss = rng.uniform(5000, 50000, size=count)
+    loss_multiplier = raw_confidence / 50
+    estimated_loss = np.round(base_loss * loss_multiplier, 2)
+    
+    # Select 2-3 random theft indicators: the first num_indicators columns
+    # of a random permutation of the pool, per customer
+    num_indicators = rng.integers(2, 3, size=count, endpoint=True)
+    picks = rng.random((count, len(indicators_pool))).argsort(axis=1)[:, :3]
+    
+    # Risk level
+    buckets = risk_buckets(raw_confidence)
+    
+    # Sort by priority (confidence * loss)
+    order = np.argsort(-(confidence * estimated_loss), kind='stable')
+    
+    hotlist = []
+    for i in order.tolist():
         prediction = {
-            "customer_id": customer_id,
-            "confidence_score": round(confidence, 2),
-            "estimated_monthly_loss": round(estimated_loss, 2),
-            "theft_indicators": theft_indicators,
-            "risk_level": risk_level,
-            "recommended_action": action
+            "customer_id": f"CUST-{customer_ids[i]}",
+            "confidence_score": float(confidence[i]),
+            "estimated_monthly_loss": float(estimated_loss[i]),
+            "theft_indicators": [indicators_pool[k] for k in picks[i, :num_indicators[i]]],
+            "risk_level": RISK_LEVELS[buckets[i]],
+            "recommended_action": RISK_ACTIONS[buckets[i]]
         }
         
         hotlist.append(prediction)
     
-    # Sort by priority (confidence * loss)
-    hotlist.sort(
-        key=lambda x: x["confidence_score"] * x["estimated_monthly_loss"],
-        reverse=True
-    )
-    
     return hotlist
 
 